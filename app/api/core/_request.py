@@ -3,6 +3,7 @@ from abc import ABC
 from typing import Optional, Union, Dict, Any, Type, TypeVar
 import httpx
 import asyncio
+import orjson
 from pydantic import BaseModel
 from app.settings.log import logger
 
@@ -14,6 +15,8 @@ class ApiRequest(ABC):
     Abstract base class for API interactions with robust session management
     """
 
+    _clients: Dict[str, httpx.AsyncClient] = {}
+
     def __init__(
         self,
         host: str,
@@ -22,11 +25,22 @@ class ApiRequest(ABC):
         Initialize API client
         """
         self.host = host.rstrip("/")
-        self._client = httpx.AsyncClient(
-            timeout=httpx.Timeout(10.0, connect=5.0, read=10.0),
-            verify=False,
-            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
-        )
+        self._client = self._get_client(self.host)
+
+    @classmethod
+    def _get_client(cls, host: str) -> httpx.AsyncClient:
+        """
+        Get or create the pooled HTTP client shared by every manager of a host
+        """
+        client = cls._clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0, connect=5.0, read=10.0),
+                verify=False,
+                limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+            )
+            cls._clients[host] = client
+        return client
 
     def _get_headers(self, access: Optional[str] = None) -> Dict[str, str]:
         """
@@ -54,7 +68,7 @@ class ApiRequest(ABC):
         Generic request method with retry mechanism and exponential backoff
         """
         headers = self._get_headers(access)
-        clean_data = self._clean_payload(data)
+        clean_data = self._clean_payload(data, convert_datetime=not access)
         clean_params = self._clean_payload(params)
         full_url = f"{self.host}/{endpoint.lstrip('/')}"
         
@@ -73,7 +87,11 @@ class ApiRequest(ABC):
                     full_url,
                     headers=headers,
                     data=clean_data if not access else None,
-                    json=clean_data if access else None,
+                    content=(
+                        orjson.dumps(clean_data)
+                        if access and clean_data is not None
+                        else None
+                    ),
                     params=clean_params,
                 )
                 response.raise_for_status()
@@ -84,9 +102,9 @@ class ApiRequest(ABC):
                     return False
 
                 if response_model:
-                    return response_model(**response.json())
+                    return response_model(**orjson.loads(response.content))
 
-                jsonres = response.json()
+                jsonres = orjson.loads(response.content)
                 return jsonres if jsonres != {} else True
 
             except httpx.HTTPStatusError as e:
@@ -114,7 +132,9 @@ class ApiRequest(ABC):
         return False
 
     def _clean_payload(
-        self, payload: Optional[Union[BaseModel, Dict[str, Any]]]
+        self,
+        payload: Optional[Union[BaseModel, Dict[str, Any]]],
+        convert_datetime: bool = True,
     ) -> Optional[Dict[str, Any]]:
         if payload is None:
             return None
@@ -125,7 +145,7 @@ class ApiRequest(ABC):
             data = payload
 
         def clean_nones_and_convert_datetime(obj: Any) -> Any:
-            if isinstance(obj, datetime):
+            if convert_datetime and isinstance(obj, datetime):
                 return obj.isoformat()
             elif isinstance(obj, dict):
                 return {
@@ -147,6 +167,8 @@ class ApiRequest(ABC):
         """
         Close the HTTP client session
         """
+        if self._clients.get(self.host) is self._client:
+            del self._clients[self.host]
         await self._client.aclose()
 
     async def get(
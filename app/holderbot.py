@@ -29,3 +29,6 @@ async def main() -> None:
         logger.error("Runtime error during polling: %s", runtime_err)
     except asyncio.CancelledError:
         logger.warning("Polling was cancelled.")
+    finally:
+        # Writes queued task changes and the final task snapshot
+        await cleanup_scheduler.stop()
@@ -3,7 +3,8 @@ Bulk user cleanup module for managing user deletion based on status
 """
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import Collection, List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
@@ -87,7 +88,7 @@ class BulkCleanupManager:
         self,
         server,
         admins: List[str],
-        status_filters: List[str],
+        status_filters: Collection[str],
         progress_callback=None
     ) -> Dict[str, Any]:
         """
@@ -134,7 +135,7 @@ class BulkCleanupManager:
         self,
         server,
         admin: str,
-        status_filters: List[str],
+        status_filters: Collection[str],
         progress_callback=None,
         processed_users_set=None
     ) -> Dict[str, Any]:
@@ -202,7 +203,7 @@ class BulkCleanupManager:
         result["total_users"] = admin_users_count
         return result
     
-    def _should_delete_user(self, user, status_filters: List[str], server_type: str) -> bool:
+    def _should_delete_user(self, user, status_filters: Collection[str], server_type: str) -> bool:
         """Check if user should be deleted based on status filters"""
         if server_type == ServerTypes.MARZNESHIN.value:
             # Marzneshin status mapping
@@ -322,23 +323,24 @@ cleanup_manager = BulkCleanupManager(
 )
 
 
-def get_status_options(server_type: str) -> List[tuple]:
+@lru_cache(maxsize=8)
+def get_status_options(server_type: str) -> Tuple[tuple, ...]:
     """Get available status options based on server type"""
     if server_type == ServerTypes.MARZNESHIN.value:
-        return [
+        return (
             ("🔴 Inactive (Not Activated)", "inactive"),
             ("⏰ Expired", "expired"),
             ("📊 Limited (Data Limit Reached)", "limited"),
             ("❌ Disabled", "disabled"),
             ("💤 Not Active", "not_active"),
-        ]
+        )
     else:  # Marzban
-        return [
+        return (
             ("❌ Disabled", "disabled"),
             ("📊 Limited", "limited"),
             ("⏰ Expired", "expired"),
             ("⏸️ On Hold", "on_hold"),
-        ]
+        )
 
 
 @router.callback_query(
@@ -575,11 +577,8 @@ async def statuses_selected(callback: CallbackQuery, callback_data: SelectCB, st
     
     # Get status names for display
     status_options = get_status_options(server_type)
-    status_names = []
-    for status_value in selected_statuses:
-        status_option = next((opt for opt in status_options if opt[1] == status_value), None)
-        if status_option:
-            status_names.append(status_option[0])
+    label_by_value = {value: label for label, value in status_options}
+    status_names = [label_by_value[v] for v in selected_statuses if v in label_by_value]
     
     # Prepare confirmation message
     admins_text = ", ".join(selected_admins[:3])
@@ -677,11 +676,8 @@ async def process_bulk_cleanup(callback: CallbackQuery, callback_data: SelectCB,
         
         # Get status names for display
         status_options = get_status_options(server_type)
-        status_names = []
-        for status_value in selected_statuses:
-            status_option = next((opt for opt in status_options if opt[1] == status_value), None)
-            if status_option:
-                status_names.append(status_option[0])
+        label_by_value = {value: label for label, value in status_options}
+        status_names = [label_by_value[v] for v in selected_statuses if v in label_by_value]
         
         # Prepare result message
         admins_text = ", ".join(selected_admins[:3])
@@ -36,7 +36,7 @@ def prepare_user_modify_data(user: MarzneshinUserResponse, preserve_all: bool =
     
     elif user.expire_strategy == UserExpireStrategy.FIXED_DATE:
         if user.expire_date:
-            modify_data["expire_date"] = user.expire_date.isoformat()
+            modify_data["expire_date"] = user.expire_date
     
     # Preserve data limit fields
     if user.data_limit is not None:
@@ -51,7 +51,7 @@ def prepare_user_modify_data(user: MarzneshinUserResponse, preserve_all: bool =
             modify_data["note"] = user.note
         
         if user.activation_deadline:
-            modify_data["activation_deadline"] = user.activation_deadline.isoformat()
+            modify_data["activation_deadline"] = user.activation_deadline
         
         # Preserve enabled status
         modify_data["enabled"] = user.enabled
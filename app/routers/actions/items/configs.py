@@ -1,13 +1,14 @@
 import asyncio
 import logging
+from weakref import WeakValueDictionary
 from aiogram import Router, F
-from aiogram.types import CallbackQuery
+from aiogram.types import CallbackQuery, Message
 from aiogram.filters import StateFilter
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
 from app.keys import BotKeys, SelectCB, Pages, Actions
-from app.db import crud
+from app.db import crud, Server
 from app.settings.language import MessageTexts
 from app.settings.track import tracker
 from app.models.action import ActionTypes
@@ -19,6 +20,19 @@ logger = logging.getLogger(__name__)
 
 router = Router(name="actions_add_config")
 
+# Optimistic concurrency between bulk runs: every successful modify advances
+# the server's epoch and stamps the user with it, and a run re-reads any user
+# stamped after the epoch it read just before requesting that page. Stamps of a
+# server are dropped once no run on it is active, since none can be stale then
+_server_epochs: dict[int, int] = {}
+_user_revisions: dict[int, dict[str, int]] = {}
+_active_runs: dict[int, int] = {}
+_user_locks: WeakValueDictionary[tuple[int, str], asyncio.Lock] = WeakValueDictionary()
+
+# One running config action per admin; sweeps run detached from the handler
+_admin_locks: dict[int, asyncio.Lock] = {}
+_background_tasks: set[asyncio.Task] = set()
+
 
 class ConfigsActionsForm(StatesGroup):
     ADMINS = State()
@@ -89,11 +103,13 @@ async def admin(callback: CallbackQuery, callback_data: SelectCB, state: FSMCont
         )
         return await tracker.add(track)
 
-    await state.update_data(configs=[config.dict() for config in configs])
+    await state.update_data(
+        config_remarks={str(config.id): config.remark for config in configs}
+    )
     return await callback.message.edit_text(
         text=MessageTexts.ITEMS,
         reply_markup=BotKeys.selector(
-            data=[config.remark for config in configs],
+            data=[(config.remark, config.id) for config in configs],
             types=Pages.ACTIONS,
             action=Actions.INFO,
             panel=server.id,
@@ -116,136 +132,206 @@ async def action(callback: CallbackQuery, callback_data: SelectCB, state: FSMCon
         return await tracker.add(track)
 
     data = await state.get_data()
-    configs = data["configs"]
-    selected = callback_data.select
-    target_config = next(
-        (config for config in configs if config["remark"] == selected), None
-    )
-    if not target_config:
+    target = int(callback_data.select)
+    target_remark = data["config_remarks"].get(str(target))
+    if not target_remark:
         track = await callback.message.edit_text(
             text=MessageTexts.NOT_FOUND,
             reply_markup=BotKeys.cancel(server_back=server.id),
         )
         return await tracker.add(track)
 
-    # Send progress message
-    progress_msg = await callback.message.edit_text(text="⏳ Processing users...")
-
-    target = int(target_config["id"])
-    action_type = data["action"]
-    adminselect = data["admin"]
-
-    async def process_user(user: MarzneshinUserResponse):
-        """Process a single user - add or remove service"""
-        try:
-            # Validate user data first
-            validation_error = validate_user_data(user)
-            if validation_error:
-                logger.warning(validation_error)
-            
-            # Check if action is needed
-            if action_type == ActionTypes.ADD_CONFIG.value:
-                if target in user.service_ids:
-                    return None  # Already has the service
-                user.service_ids.append(target)
-                action_name = "add"
-            elif action_type == ActionTypes.DELETE_CONFIG.value:
-                if target not in user.service_ids:
-                    return None  # Doesn't have the service
-                user.service_ids.remove(target)
-                action_name = "remove"
-            else:
-                return None
+    lock = _admin_locks.setdefault(callback.from_user.id, asyncio.Lock())
+    if lock.locked():
+        return await callback.answer(
+            text="⏳ A config action is already running", show_alert=True
+        )
+    await lock.acquire()
+    try:
+        # Send progress message
+        progress_msg = await callback.message.edit_text(text="⏳ Processing users...")
 
-            # Use helper to prepare data with all fields preserved
-            modify_data = prepare_user_modify_data(user, preserve_all=True)
-            
-            # Call API to modify user
-            result = await ClinetManager.modify_user(
+        task = asyncio.create_task(
+            _run_bulk(
+                callback=callback,
                 server=server,
-                username=user.username,
-                data=modify_data,
-            )
-            
-            # Log the result
-            log_user_modification(
-                username=user.username,
-                action=action_name,
-                service_id=target,
-                success=bool(result),
-                error=None if result else "API call failed"
+                target=target,
+                target_remark=target_remark,
+                action_type=data["action"],
+                adminselect=data["admin"],
+                progress_msg=progress_msg,
+                lock=lock,
             )
-            
-            return result
-        except Exception as e:
-            logger.error(f"Error processing user {user.username}: {e}")
-            log_user_modification(
-                username=user.username,
-                action=action_type,
-                service_id=target,
-                success=False,
-                error=str(e)
-            )
-            return None
-
-    # Process users in batches
-    page = 1
-    total_processed = 0
-    success_count = 0
-    failed_count = 0
-    batch_size = 10  # Process 10 users concurrently
-
-    while True:
-        # Get users page
-        users = await ClinetManager.get_users(
-            server,
-            page,
-            size=server.size_value,
-            owner_username=None if adminselect == "ALL" else adminselect,
         )
-        if not users:
-            break
-
-        # Process users in smaller batches for better performance
-        for i in range(0, len(users), batch_size):
-            batch = users[i:i+batch_size]
-            results = await asyncio.gather(
-                *(process_user(user) for user in batch),
-                return_exceptions=True
-            )
-            
-            for result in results:
-                if result is not None:
-                    if isinstance(result, Exception):
-                        failed_count += 1
-                    elif result:
-                        success_count += 1
+    except BaseException:
+        # The sweep never started, so it can't release the lock itself
+        lock.release()
+        raise
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _run_bulk(
+    callback: CallbackQuery,
+    server: Server,
+    target: int,
+    target_remark: str,
+    action_type: str,
+    adminselect: str,
+    progress_msg: Message,
+    lock: asyncio.Lock,
+) -> None:
+    """Sweep every user page in the background and report the totals"""
+    _active_runs[server.id] = _active_runs.get(server.id, 0) + 1
+    revisions = _user_revisions.setdefault(server.id, {})
+    try:
+        async def process_user(user: MarzneshinUserResponse, fetched_at: int):
+            """Process a single user - add or remove service"""
+            key = (server.id, user.username)
+            user_lock = _user_locks.setdefault(key, asyncio.Lock())
+            try:
+                async with user_lock:
+                    # Another run changed this user after our page was requested,
+                    # so only this user is re-read before applying the change
+                    if revisions.get(user.username, 0) > fetched_at:
+                        user = await ClinetManager.get_user(server, user.username)
+                        if not user:
+                            return False
+
+                    # Validate user data first
+                    validation_error = validate_user_data(user)
+                    if validation_error:
+                        logger.warning(validation_error)
+
+                    # Check if action is needed
+                    if action_type == ActionTypes.ADD_CONFIG.value:
+                        if target in user.service_ids:
+                            return None  # Already has the service
+                        user.service_ids.append(target)
+                        action_name = "add"
+                    elif action_type == ActionTypes.DELETE_CONFIG.value:
+                        if target not in user.service_ids:
+                            return None  # Doesn't have the service
+                        user.service_ids.remove(target)
+                        action_name = "remove"
                     else:
-                        failed_count += 1
-                total_processed += 1
-            
-            # Update progress every batch
-            if total_processed % 50 == 0:
-                await progress_msg.edit_text(
-                    text=f"⏳ Processing... {total_processed} users processed"
+                        return None
+
+                    # Use helper to prepare data with all fields preserved
+                    modify_data = prepare_user_modify_data(user, preserve_all=True)
+
+                    # Call API to modify user
+                    result = await ClinetManager.modify_user(
+                        server=server,
+                        username=user.username,
+                        data=modify_data,
+                    )
+                    if result:
+                        epoch = _server_epochs.get(server.id, 0) + 1
+                        _server_epochs[server.id] = epoch
+                        revisions[user.username] = epoch
+
+                # Log the result
+                log_user_modification(
+                    username=user.username,
+                    action=action_name,
+                    service_id=target,
+                    success=bool(result),
+                    error=None if result else "API call failed"
                 )
 
-        page += 1
-
-    # Send final result
-    action_text = "Added" if action_type == ActionTypes.ADD_CONFIG.value else "Removed"
-    result_text = (
-        f"✅ Action Completed!\n\n"
-        f"Service: {target_config['remark']}\n"
-        f"Action: {action_text}\n"
-        f"Admin: {adminselect}\n"
-        f"Success: {success_count}\n"
-        f"Failed: {failed_count}\n"
-        f"Total Processed: {total_processed}"
-    )
-    
-    track = await callback.message.answer(
-        text=result_text,
-        reply_markup=BotKeys.cancel(server_back=server.id),
-    )
-    return await tracker.cleardelete(callback, track)
+                return result
+            except Exception as e:
+                logger.error(f"Error processing user {user.username}: {e}")
+                log_user_modification(
+                    username=user.username,
+                    action=action_type,
+                    service_id=target,
+                    success=False,
+                    error=str(e)
+                )
+                return None
+
+        # Process users in batches
+        page = 1
+        total_processed = 0
+        success_count = 0
+        failed_count = 0
+        batch_size = 10  # Process 10 users concurrently
+        page_size = server.size_value
+        owner = None if adminselect == "ALL" else adminselect
+
+        while True:
+            # Read the epoch before the request: a modify finishing while it is
+            # in flight may be missing from the page, and must trigger a re-read
+            fetched_at = _server_epochs.get(server.id, 0)
+
+            # Get users page
+            users = await ClinetManager.get_users(
+                server,
+                page,
+                size=page_size,
+                owner_username=owner,
+            )
+            if not users:
+                break
+
+            # Process users in smaller batches for better performance
+            for i in range(0, len(users), batch_size):
+                batch = users[i:i+batch_size]
+                results = await asyncio.gather(
+                    *(process_user(user, fetched_at) for user in batch),
+                    return_exceptions=True
+                )
+
+                for result in results:
+                    if result is not None:
+                        if isinstance(result, Exception):
+                            failed_count += 1
+                        elif result:
+                            success_count += 1
+                        else:
+                            failed_count += 1
+                    total_processed += 1
+
+                # Update progress every batch
+                if total_processed % 50 == 0:
+                    await progress_msg.edit_text(
+                        text=f"⏳ Processing... {total_processed} users processed"
+                    )
+
+            page += 1
+
+        # Send final result
+        action_text = "Added" if action_type == ActionTypes.ADD_CONFIG.value else "Removed"
+        result_text = (
+            f"✅ Action Completed!\n\n"
+            f"Service: {target_remark}\n"
+            f"Action: {action_text}\n"
+            f"Admin: {adminselect}\n"
+            f"Success: {success_count}\n"
+            f"Failed: {failed_count}\n"
+            f"Total Processed: {total_processed}"
+        )
+
+        track = await callback.message.answer(
+            text=result_text,
+            reply_markup=BotKeys.cancel(server_back=server.id),
+        )
+        await tracker.cleardelete(callback, track)
+    except Exception as e:
+        logger.error(f"Bulk config action failed on server {server.id}: {e}")
+        try:
+            await progress_msg.edit_text(
+                text=MessageTexts.FAILED,
+                reply_markup=BotKeys.cancel(server_back=server.id),
+            )
+        except Exception as edit_error:
+            logger.warning(f"Could not report bulk config failure: {edit_error}")
+    finally:
+        lock.release()
+        _active_runs[server.id] -= 1
+        if not _active_runs[server.id]:
+            del _active_runs[server.id]
+            _user_revisions.pop(server.id, None)
+            _server_epochs.pop(server.id, None)
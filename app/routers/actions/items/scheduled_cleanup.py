@@ -1,10 +1,16 @@
 """
 Scheduled cleanup management module for managing automatic cleanup tasks
 """
+import asyncio
 import logging
-from typing import List, Dict, Any
+import secrets
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from itertools import islice
+from weakref import WeakValueDictionary
+from typing import List, Dict, Any, Final, Optional
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup
 from aiogram.filters import StateFilter
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
@@ -21,6 +27,37 @@ from app.routers.actions.items.bulk_cleanup import get_status_options
 router = Router(name="scheduled_cleanup")
 logger = logging.getLogger(__name__)
 
+_INTERVAL_OPTIONS: Final = (
+    ("⏰ Every 1 Hour", "1"),
+    ("🕐 Every 2 Hours", "2"),
+    ("🕕 Every 6 Hours", "6"),
+    ("🕛 Every 12 Hours", "12"),
+    ("📅 Every 24 Hours (Daily)", "24"),
+    ("📅 Every 48 Hours (2 Days)", "48"),
+    ("📅 Every 72 Hours (3 Days)", "72"),
+    ("📅 Every 168 Hours (Weekly)", "168")
+)
+_INTERVAL_LABELS: Final = {
+    1: "1 hour", 2: "2 hours", 6: "6 hours", 12: "12 hours",
+    24: "Daily", 48: "48 hours", 72: "72 hours", 168: "Weekly"
+}
+# Task actions travel as short codes: the task id already rides in SelectCB.extra
+# and Telegram caps callback_data at 64 bytes
+_TASK_ACTION_LABELS: Final = {
+    "dis": "⏸️ Disable Task",
+    "en": "▶️ Enable Task",
+    "del": "🗑️ Delete Task",
+    "view": "📊 View Details",
+}
+_TASK_ACTIONS: Final = frozenset(_TASK_ACTION_LABELS)
+_CONFIRM_ACTIONS: Final = frozenset({"✅ Create Task", "❌ Cancel"})
+_TASK_DISPATCH: Final = {
+    "dis": (cleanup_scheduler.disable_task, "disabled"),
+    "en": (cleanup_scheduler.enable_task, "enabled"),
+    "del": (cleanup_scheduler.remove_task, "deleted"),
+}
+_user_locks: WeakValueDictionary[tuple, asyncio.Lock] = WeakValueDictionary()
+
 
 class ScheduledCleanupForm(StatesGroup):
     """States for scheduled cleanup workflow"""
@@ -31,6 +68,79 @@ class ScheduledCleanupForm(StatesGroup):
     MANAGE_TASKS = State()
 
 
+async def mutate_state(state: FSMContext, data: Optional[Dict[str, Any]] = None, **updates) -> Dict[str, Any]:
+    """Apply updates to the FSM data with a single read and a single write"""
+    if data is None:
+        data = await state.get_data()
+    data.update(updates)
+    await state.set_data(data)
+    return data
+
+
+@lru_cache(maxsize=128)
+def cached_selector(
+    types: Pages,
+    action: Actions,
+    panel: int,
+    data: tuple,
+    selects: frozenset,
+    all_selects: bool,
+    server_back: int
+) -> InlineKeyboardMarkup:
+    """Build a checkbox keyboard once per (items, selection) combination
+
+    The markup is shared by every caller with the same arguments and aiogram
+    markups are mutable, so callers must treat the result as read-only
+    """
+    return BotKeys.selector(
+        data=data,
+        types=types,
+        action=action,
+        panel=panel,
+        selects=selects,
+        all_selects=all_selects,
+        server_back=server_back
+    )
+
+
+def render_hash(text: str, reply_markup: InlineKeyboardMarkup) -> int:
+    """Fingerprint a rendered message to detect no-op edits"""
+    return hash((
+        text,
+        tuple(
+            (button.text, button.callback_data)
+            for row in reply_markup.inline_keyboard
+            for button in row
+        )
+    ))
+
+
+@asynccontextmanager
+async def user_lock(callback: CallbackQuery):
+    """Serialize mutating handlers per (bot, chat, user) against double taps"""
+    key = (callback.bot.id, callback.message.chat.id, callback.from_user.id)
+    lock = _user_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        yield
+
+
+def new_task_id(server_id: int) -> str:
+    """Random task id, unique across restarts and short enough for callback data"""
+    return f"cleanup_{server_id}_{secrets.token_hex(4)}"
+
+
+def interval_label(hours: int) -> str:
+    """Human readable label for a cleanup interval"""
+    return _INTERVAL_LABELS.get(hours, f"{hours} hours")
+
+
+def resolve_selected_admins(data: Dict[str, Any]) -> List[str]:
+    """Expand the select-all sentinel back to the full admin list"""
+    if data.get("selected_admins_mode") == "all":
+        return data.get("admin_list", [])
+    return data.get("selected_admins", [])
+
+
 @router.callback_query(
     SelectCB.filter(
         (F.types == Pages.ACTIONS)
@@ -40,7 +150,11 @@ class ScheduledCleanupForm(StatesGroup):
 )
 async def show_scheduled_cleanup_menu(callback: CallbackQuery, callback_data: SelectCB, state: FSMContext):
     """Show scheduled cleanup management menu"""
-    server = await crud.get_server(callback_data.panel)
+    # Get the server and its existing tasks
+    server, server_tasks = await asyncio.gather(
+        crud.get_server(callback_data.panel),
+        cleanup_scheduler.get_tasks_for_server(callback_data.panel)
+    )
     if not server:
         track = await callback.message.edit_text(
             text=MessageTexts.NOT_FOUND,
@@ -48,10 +162,6 @@ async def show_scheduled_cleanup_menu(callback: CallbackQuery, callback_data: Se
         )
         return await tracker.add(track)
     
-    # Get existing tasks for this server
-    all_tasks = await cleanup_scheduler.get_tasks()
-    server_tasks = {k: v for k, v in all_tasks.items() if v.server_id == server.id}
-    
     menu_options = [
         "➕ Create New Task",
         "📋 Manage Existing Tasks"
@@ -93,11 +203,11 @@ async def start_create_scheduled_task(callback: CallbackQuery, callback_data: Se
         )
         return await tracker.add(track)
     
-    await state.set_state(ScheduledCleanupForm.SELECT_ADMINS)
-    await state.update_data(selected_admins=[], server_type=server.types, server_id=server.id)
-    
-    # Get admins for selection
-    admins = await ClinetManager.get_admins(server=server)
+    # Get admins for selection while the state is being stored
+    _, admins = await asyncio.gather(
+        state.set_state(ScheduledCleanupForm.SELECT_ADMINS),
+        ClinetManager.get_admins(server=server)
+    )
     if not admins:
         track = await callback.message.edit_text(
             text="❌ No admins found",
@@ -108,6 +218,16 @@ async def start_create_scheduled_task(callback: CallbackQuery, callback_data: Se
     # Show admin selection with checkboxes
     admin_list = [admin.username for admin in admins]
     
+    # Cache the admin list so checkbox toggles don't hit the DB/panel again
+    await state.update_data(
+        selected_admins=[],
+        selected_admins_mode=None,
+        last_render_hash=None,
+        admin_list=admin_list,
+        server_type=server.types,
+        server_id=server.id
+    )
+    
     return await callback.message.edit_text(
         text="⏰ Create Scheduled Cleanup Task\n\n📋 Select Admins\n\nChoose admins whose users will be automatically cleaned up:",
         reply_markup=BotKeys.selector(
@@ -131,7 +251,11 @@ async def start_create_scheduled_task(callback: CallbackQuery, callback_data: Se
 )
 async def show_existing_tasks(callback: CallbackQuery, callback_data: SelectCB, state: FSMContext):
     """Show existing scheduled tasks"""
-    server = await crud.get_server(callback_data.panel)
+    # Get the server and its existing tasks
+    server, server_tasks = await asyncio.gather(
+        crud.get_server(callback_data.panel),
+        cleanup_scheduler.get_tasks_for_server(callback_data.panel)
+    )
     if not server:
         track = await callback.message.edit_text(
             text=MessageTexts.NOT_FOUND,
@@ -139,44 +263,59 @@ async def show_existing_tasks(callback: CallbackQuery, callback_data: SelectCB,
         )
         return await tracker.add(track)
     
-    # Get existing tasks for this server
-    all_tasks = await cleanup_scheduler.get_tasks()
-    server_tasks = {k: v for k, v in all_tasks.items() if v.server_id == server.id}
-    
-    if not server_tasks:
-        return await callback.message.edit_text(
-            text="📋 No scheduled tasks found for this server.\n\nCreate a new task to get started!",
-            reply_markup=BotKeys.cancel(server_back=server.id)
-        )
-    
-    # Create task list for selection
-    task_options = []
+    return await _render_existing_tasks(callback, server.id, server_tasks, state)
+
+
+def _iter_task_options(server_tasks: Dict[str, Any]):
+    """Yield (label, task_id) selector entries as the keyboard is built"""
     for task_id, task in server_tasks.items():
         status_emoji = "✅" if task.enabled else "⏸️"
-        admins_text = ", ".join(task.admin_usernames[:2])
+        admins_text = ", ".join(islice(task.admin_usernames, 2))
         if len(task.admin_usernames) > 2:
             admins_text += f" +{len(task.admin_usernames) - 2}"
         
-        task_options.append((
+        yield (
             f"{status_emoji} {task_id} | {admins_text} | {task.interval_hours}h",
             task_id
-        ))
+        )
+
+
+async def _render_existing_tasks(
+    callback: CallbackQuery,
+    server_id: int,
+    server_tasks: Dict[str, Any],
+    state: FSMContext
+):
+    """Render the task list of a server from already fetched tasks"""
+    if not server_tasks:
+        return await callback.message.edit_text(
+            text="📋 No scheduled tasks found for this server.\n\nCreate a new task to get started!",
+            reply_markup=BotKeys.cancel(server_back=server_id)
+        )
     
     await state.set_state(ScheduledCleanupForm.MANAGE_TASKS)
-    await state.update_data(server_id=server.id)
+    await state.update_data(server_id=server_id)
     
     return await callback.message.edit_text(
         text="📋 Existing Scheduled Tasks\n\nSelect a task to manage:",
         reply_markup=BotKeys.selector(
-            data=task_options,
+            data=_iter_task_options(server_tasks),
             types=Pages.BULK_CONFIG,
             action=Actions.SELECT_SERVICE,
-            panel=server.id,
-            server_back=server.id
+            panel=server_id,
+            server_back=server_id
         )
     )
 
 
+def _task_action_options(task) -> List[tuple]:
+    """(label, code) selector entries for the actions available on a task"""
+    toggle = "dis" if task.enabled else "en"
+    return [
+        (_TASK_ACTION_LABELS[code], code) for code in (toggle, "del", "view")
+    ]
+
+
 @router.callback_query(
     StateFilter(ScheduledCleanupForm.MANAGE_TASKS),
     SelectCB.filter(
@@ -193,21 +332,9 @@ async def manage_specific_task(callback: CallbackQuery, callback_data: SelectCB,
         await callback.answer("❌ Task not found", show_alert=True)
         return
     
-    # Create management options
-    options = []
-    if task.enabled:
-        options.append("⏸️ Disable Task")
-    else:
-        options.append("▶️ Enable Task")
-    
-    options.extend([
-        "🗑️ Delete Task",
-        "📊 View Details"
-    ])
-    
     status_text = "✅ Active" if task.enabled else "⏸️ Inactive"
     admins_text = ", ".join(task.admin_usernames)
-    next_run_text = task.next_run.strftime("%Y-%m-%d %H:%M") if task.next_run else "Not scheduled"
+    next_run_text = task.next_run_str or "Not scheduled"
     
     return await callback.message.edit_text(
         text=(
@@ -219,10 +346,11 @@ async def manage_specific_task(callback: CallbackQuery, callback_data: SelectCB,
             f"Choose an action:"
         ),
         reply_markup=BotKeys.selector(
-            data=options,
+            data=_task_action_options(task),
             types=Pages.BULK_CONFIG,
             action=Actions.CONFIRM,
-            panel=f"{callback_data.panel}:{task_id}",  # Encode task_id in panel
+            panel=callback_data.panel,
+            extra=task_id,
             server_back=callback_data.panel
         )
     )
@@ -232,73 +360,61 @@ async def manage_specific_task(callback: CallbackQuery, callback_data: SelectCB,
     SelectCB.filter(
         (F.types.is_(Pages.BULK_CONFIG))
         & (F.action.is_(Actions.CONFIRM))
-        & (F.select.in_(["⏸️ Disable Task", "▶️ Enable Task", "🗑️ Delete Task", "📊 View Details"]))
+        & (F.select.in_(_TASK_ACTIONS))
     )
 )
 async def execute_task_action(callback: CallbackQuery, callback_data: SelectCB, state: FSMContext):
     """Execute action on scheduled task"""
-    # Extract server_id and task_id from panel
-    panel_parts = callback_data.panel.split(":")
-    server_id = int(panel_parts[0])
-    task_id = panel_parts[1] if len(panel_parts) > 1 else None
-    
-    if not task_id:
-        await callback.answer("❌ Invalid task", show_alert=True)
-        return
-    
-    action = callback_data.select
-    success = False
-    message = ""
-    
-    if action == "⏸️ Disable Task":
-        success = await cleanup_scheduler.disable_task(task_id)
-        message = "✅ Task disabled successfully" if success else "❌ Failed to disable task"
-    
-    elif action == "▶️ Enable Task":
-        success = await cleanup_scheduler.enable_task(task_id)
-        message = "✅ Task enabled successfully" if success else "❌ Failed to enable task"
-    
-    elif action == "🗑️ Delete Task":
-        success = await cleanup_scheduler.remove_task(task_id)
-        message = "✅ Task deleted successfully" if success else "❌ Failed to delete task"
-    
-    elif action == "📊 View Details":
-        task = await cleanup_scheduler.get_task(task_id)
-        if task:
-            last_run_text = task.last_run.strftime("%Y-%m-%d %H:%M") if task.last_run else "Never"
-            next_run_text = task.next_run.strftime("%Y-%m-%d %H:%M") if task.next_run else "Not scheduled"
-            created_text = task.created_at.strftime("%Y-%m-%d %H:%M") if task.created_at else "Unknown"
+    async with user_lock(callback):
+        server_id = callback_data.panel
+        task_id = callback_data.extra
+    
+        if not task_id:
+            await callback.answer("❌ Invalid task", show_alert=True)
+            return
+    
+        action = callback_data.select
+        success = False
+        message = ""
+    
+        handler = _TASK_DISPATCH.get(action)
+        if handler:
+            method, verb = handler
+            success = await method(task_id)
+            message = f"✅ Task {verb} successfully" if success else f"❌ Failed to {verb[:-1]} task"
+        elif action == "view":
+            task = await cleanup_scheduler.get_task(task_id)
+            if task:
+                last_run_text = task.last_run_str or "Never"
+                next_run_text = task.next_run_str or "Not scheduled"
+                created_text = task.created_at_str or "Unknown"
             
-            details_text = (
-                f"📊 Task Details: {task_id}\n\n"
-                f"Status: {'✅ Active' if task.enabled else '⏸️ Inactive'}\n"
-                f"Server ID: {task.server_id}\n"
-                f"Admins: {', '.join(task.admin_usernames)}\n"
-                f"Status Filters: {', '.join(task.status_filters)}\n"
-                f"Interval: {task.interval_hours} hours\n"
-                f"Created: {created_text}\n"
-                f"Last Run: {last_run_text}\n"
-                f"Next Run: {next_run_text}"
-            )
+                details_text = (
+                    f"📊 Task Details: {task_id}\n\n"
+                    f"Status: {'✅ Active' if task.enabled else '⏸️ Inactive'}\n"
+                    f"Server ID: {task.server_id}\n"
+                    f"Admins: {', '.join(task.admin_usernames)}\n"
+                    f"Status Filters: {', '.join(task.status_filters)}\n"
+                    f"Interval: {task.interval_hours} hours\n"
+                    f"Created: {created_text}\n"
+                    f"Last Run: {last_run_text}\n"
+                    f"Next Run: {next_run_text}"
+                )
             
-            return await callback.message.edit_text(
-                text=details_text,
-                reply_markup=BotKeys.cancel(server_back=server_id)
-            )
-        else:
-            message = "❌ Task not found"
-    
-    await callback.answer(message, show_alert=True)
-    
-    # Return to task list if action was successful
-    if success and action != "📊 View Details":
-        # Redirect back to existing tasks view
-        return await show_existing_tasks(callback, SelectCB(
-            types=Pages.BULK_CONFIG,
-            action=Actions.SELECT_ADMIN,
-            select="📋 Manage Existing Tasks",
-            panel=server_id
-        ), state)
+                return await callback.message.edit_text(
+                    text=details_text,
+                    reply_markup=BotKeys.cancel(server_back=server_id)
+                )
+            else:
+                message = "❌ Task not found"
+    
+        await callback.answer(message, show_alert=True)
+    
+        # Return to task list if action was successful
+        if success and action != "view":
+            # Redirect back to existing tasks view
+            server_tasks = await cleanup_scheduler.get_tasks_for_server(server_id)
+            return await _render_existing_tasks(callback, server_id, server_tasks, state)
 
 
 # Continue with the admin selection handlers for creating new tasks
@@ -312,48 +428,54 @@ async def execute_task_action(callback: CallbackQuery, callback_data: SelectCB,
 )
 async def toggle_admin_selection_scheduled(callback: CallbackQuery, callback_data: SelectCB, state: FSMContext):
     """Handle admin checkbox toggle for scheduled cleanup"""
-    data = await state.get_data()
-    selected_admins = data.get("selected_admins", [])
-    server = await crud.get_server(callback_data.panel)
-    
-    if not server:
-        track = await callback.message.edit_text(
-            text=MessageTexts.NOT_FOUND,
-            reply_markup=BotKeys.cancel()
-        )
-        return await tracker.add(track)
-    
-    # Get all admins for the list
-    admins = await ClinetManager.get_admins(server=server)
-    admin_list = [admin.username for admin in admins]
-    
-    # Handle select all/deselect all
-    if callback_data.select == SelectAll.SELECT:
-        selected_admins = admin_list.copy()
-    elif callback_data.select == SelectAll.DESELECT:
-        selected_admins = []
-    else:
-        # Toggle individual selection
-        if callback_data.select in selected_admins:
-            selected_admins.remove(callback_data.select)
+    async with user_lock(callback):
+        data = await state.get_data()
+        selected_admins = resolve_selected_admins(data)
+        admin_list = data.get("admin_list", [])
+        selected_admins_mode = None
+    
+        # Handle select all/deselect all
+        if callback_data.select == SelectAll.SELECT:
+            # Store a sentinel instead of a copy of the whole admin list
+            selected_admins = admin_list
+            selected_admins_mode = "all"
+        elif callback_data.select == SelectAll.DESELECT:
+            selected_admins = []
         else:
-            selected_admins.append(callback_data.select)
-    
-    await state.update_data(selected_admins=selected_admins)
-    
-    # Update the keyboard with new selection
-    return await callback.message.edit_text(
-        text=f"⏰ Create Scheduled Cleanup Task\n\n📋 Select Admins\n\nSelected: {len(selected_admins)}/{len(admin_list)}\n\nChoose admins whose users will be automatically cleaned up:",
-        reply_markup=BotKeys.selector(
-            data=admin_list,
+            # Toggle individual selection on an ordered set (FSM data stays a JSON list)
+            selected = dict.fromkeys(selected_admins)
+            if callback_data.select in selected:
+                del selected[callback_data.select]
+            else:
+                selected[callback_data.select] = None
+            selected_admins = list(selected)
+    
+        text = f"⏰ Create Scheduled Cleanup Task\n\n📋 Select Admins\n\nSelected: {len(selected_admins)}/{len(admin_list)}\n\nChoose admins whose users will be automatically cleaned up:"
+        reply_markup = cached_selector(
+            data=tuple(admin_list),
             types=Pages.BULK_CONFIG,
             action=Actions.SELECT_ADMIN,
-            panel=server.id,
-            selects=selected_admins,
+            panel=callback_data.panel,
+            selects=frozenset(selected_admins),
             all_selects=True,
-            server_back=server.id
+            server_back=callback_data.panel
         )
-    )
+    
+        # Nothing changed on screen, so neither the state nor the message needs a write
+        last_render_hash = render_hash(text, reply_markup)
+        if data.get("last_render_hash") == last_render_hash:
+            return await callback.answer()
+    
+        await mutate_state(
+            state,
+            data,
+            selected_admins=[] if selected_admins_mode else selected_admins,
+            selected_admins_mode=selected_admins_mode,
+            last_render_hash=last_render_hash
+        )
+    
+        # Update the keyboard with new selection
+        return await callback.message.edit_text(text=text, reply_markup=reply_markup)
 
 
 @router.callback_query(
@@ -367,28 +489,20 @@ async def toggle_admin_selection_scheduled(callback: CallbackQuery, callback_dat
 async def admins_selected_scheduled(callback: CallbackQuery, callback_data: SelectCB, state: FSMContext):
     """Proceed to status selection after admins are selected"""
     data = await state.get_data()
-    selected_admins = data.get("selected_admins", [])
+    selected_admins = resolve_selected_admins(data)
     server_type = data.get("server_type")
     
     if not selected_admins:
         await callback.answer("⚠️ Please select at least one admin", show_alert=True)
         return
     
-    server = await crud.get_server(callback_data.panel)
-    if not server:
-        track = await callback.message.edit_text(
-            text=MessageTexts.NOT_FOUND,
-            reply_markup=BotKeys.cancel()
-        )
-        return await tracker.add(track)
-    
     await state.set_state(ScheduledCleanupForm.SELECT_STATUS)
-    await state.update_data(selected_statuses=[])
+    await mutate_state(state, data, selected_statuses=[], last_render_hash=None)
     
     # Get status options based on server type
     status_options = get_status_options(server_type)
     
-    admins_text = ", ".join(selected_admins[:5])
+    admins_text = ", ".join(islice(selected_admins, 5))
     if len(selected_admins) > 5:
         admins_text += f" and {len(selected_admins) - 5} more"
     
@@ -398,10 +512,10 @@ async def admins_selected_scheduled(callback: CallbackQuery, callback_data: Sele
             data=status_options,
             types=Pages.BULK_CONFIG,
             action=Actions.SELECT_SERVICE,
-            panel=server.id,
+            panel=callback_data.panel,
             selects=[],
             all_selects=True,
-            server_back=server.id
+            server_back=callback_data.panel
         )
     )
 
@@ -416,54 +530,59 @@ async def admins_selected_scheduled(callback: CallbackQuery, callback_data: Sele
 )
 async def toggle_status_selection_scheduled(callback: CallbackQuery, callback_data: SelectCB, state: FSMContext):
     """Handle status checkbox toggle for scheduled cleanup"""
-    data = await state.get_data()
-    selected_statuses = data.get("selected_statuses", [])
-    selected_admins = data.get("selected_admins", [])
-    server_type = data.get("server_type")
-    server = await crud.get_server(callback_data.panel)
-    
-    if not server:
-        track = await callback.message.edit_text(
-            text=MessageTexts.NOT_FOUND,
-            reply_markup=BotKeys.cancel()
-        )
-        return await tracker.add(track)
-    
-    # Get status options
-    status_options = get_status_options(server_type)
-    status_values = [option[1] for option in status_options]
-    
-    # Handle select all/deselect all
-    if callback_data.select == SelectAll.SELECT:
-        selected_statuses = status_values.copy()
-    elif callback_data.select == SelectAll.DESELECT:
-        selected_statuses = []
-    else:
-        # Toggle individual selection
-        if callback_data.select in selected_statuses:
-            selected_statuses.remove(callback_data.select)
+    async with user_lock(callback):
+        data = await state.get_data()
+        selected_statuses = data.get("selected_statuses", [])
+        selected_admins = resolve_selected_admins(data)
+        server_type = data.get("server_type")
+    
+        # Get status options
+        status_options = get_status_options(server_type)
+        status_values = [option[1] for option in status_options]
+    
+        # Handle select all/deselect all
+        if callback_data.select == SelectAll.SELECT:
+            selected_statuses = status_values.copy()
+        elif callback_data.select == SelectAll.DESELECT:
+            selected_statuses = []
         else:
-            selected_statuses.append(callback_data.select)
-    
-    await state.update_data(selected_statuses=selected_statuses)
-    
-    admins_text = ", ".join(selected_admins[:5])
-    if len(selected_admins) > 5:
-        admins_text += f" and {len(selected_admins) - 5} more"
-    
-    # Update the keyboard with new selection
-    return await callback.message.edit_text(
-        text=f"⏰ Create Scheduled Cleanup Task\n\n🏷️ Select Status Filters\n\nAdmins: {admins_text}\nSelected: {len(selected_statuses)}/{len(status_options)}\n\nChoose user statuses to automatically delete:",
-        reply_markup=BotKeys.selector(
+            # Toggle individual selection on an ordered set (FSM data stays a JSON list)
+            selected = dict.fromkeys(selected_statuses)
+            if callback_data.select in selected:
+                del selected[callback_data.select]
+            else:
+                selected[callback_data.select] = None
+            selected_statuses = list(selected)
+    
+        admins_text = ", ".join(islice(selected_admins, 5))
+        if len(selected_admins) > 5:
+            admins_text += f" and {len(selected_admins) - 5} more"
+    
+        text = f"⏰ Create Scheduled Cleanup Task\n\n🏷️ Select Status Filters\n\nAdmins: {admins_text}\nSelected: {len(selected_statuses)}/{len(status_options)}\n\nChoose user statuses to automatically delete:"
+        reply_markup = cached_selector(
             data=status_options,
             types=Pages.BULK_CONFIG,
             action=Actions.SELECT_SERVICE,
-            panel=server.id,
-            selects=selected_statuses,
+            panel=callback_data.panel,
+            selects=frozenset(selected_statuses),
             all_selects=True,
-            server_back=server.id
+            server_back=callback_data.panel
         )
-    )
+    
+        # Nothing changed on screen, so neither the state nor the message needs a write
+        last_render_hash = render_hash(text, reply_markup)
+        if data.get("last_render_hash") == last_render_hash:
+            return await callback.answer()
+    
+        await mutate_state(
+            state,
+            data,
+            selected_statuses=selected_statuses,
+            last_render_hash=last_render_hash
+        )
+    
+        # Update the keyboard with new selection
+        return await callback.message.edit_text(text=text, reply_markup=reply_markup)
 
 
 @router.callback_query(
@@ -485,27 +604,15 @@ async def statuses_selected_scheduled(callback: CallbackQuery, callback_data: Se
     
     await state.set_state(ScheduledCleanupForm.SET_INTERVAL)
     
-    # Show interval options
-    interval_options = [
-        ("⏰ Every 1 Hour", "1"),
-        ("🕐 Every 2 Hours", "2"),
-        ("🕕 Every 6 Hours", "6"),
-        ("🕛 Every 12 Hours", "12"),
-        ("📅 Every 24 Hours (Daily)", "24"),
-        ("📅 Every 48 Hours (2 Days)", "48"),
-        ("📅 Every 72 Hours (3 Days)", "72"),
-        ("📅 Every 168 Hours (Weekly)", "168")
-    ]
-    
-    selected_admins = data.get("selected_admins", [])
-    admins_text = ", ".join(selected_admins[:3])
+    selected_admins = resolve_selected_admins(data)
+    admins_text = ", ".join(islice(selected_admins, 3))
     if len(selected_admins) > 3:
         admins_text += f" and {len(selected_admins) - 3} more"
     
     return await callback.message.edit_text(
         text=f"⏰ Create Scheduled Cleanup Task\n\n⏱️ Set Cleanup Interval\n\nAdmins: {admins_text}\nStatus Filters: {len(selected_statuses)} selected\n\nHow often should the cleanup run?",
         reply_markup=BotKeys.selector(
-            data=interval_options,
+            data=_INTERVAL_OPTIONS,
             types=Pages.BULK_CONFIG,
             action=Actions.CONFIRM,
             panel=callback_data.panel,
@@ -524,35 +631,26 @@ async def statuses_selected_scheduled(callback: CallbackQuery, callback_data: Se
 async def interval_selected(callback: CallbackQuery, callback_data: SelectCB, state: FSMContext):
     """Show confirmation after interval is selected"""
     interval_hours = int(callback_data.select)
-    await state.update_data(interval_hours=interval_hours)
-    
-    data = await state.get_data()
-    selected_admins = data.get("selected_admins", [])
+    data = await mutate_state(state, interval_hours=interval_hours)
+    selected_admins = resolve_selected_admins(data)
     selected_statuses = data.get("selected_statuses", [])
     server_type = data.get("server_type")
     
     # Get status names for display
     status_options = get_status_options(server_type)
-    status_names = []
-    for status_value in selected_statuses:
-        status_option = next((opt for opt in status_options if opt[1] == status_value), None)
-        if status_option:
-            status_names.append(status_option[0])
+    label_by_value = {value: label for label, value in status_options}
+    status_names = [label_by_value[v] for v in selected_statuses if v in label_by_value]
     
     # Prepare confirmation message
-    admins_text = ", ".join(selected_admins[:3])
+    admins_text = ", ".join(islice(selected_admins, 3))
     if len(selected_admins) > 3:
         admins_text += f" and {len(selected_admins) - 3} more"
     
-    statuses_text = ", ".join(status_names[:3])
+    statuses_text = ", ".join(islice(status_names, 3))
     if len(status_names) > 3:
         statuses_text += f" and {len(status_names) - 3} more"
     
-    interval_text = f"{interval_hours} hour{'s' if interval_hours > 1 else ''}"
-    if interval_hours == 24:
-        interval_text = "Daily"
-    elif interval_hours == 168:
-        interval_text = "Weekly"
+    interval_text = interval_label(interval_hours)
     
     confirmation_text = (
         f"⚠️ Confirm Scheduled Cleanup Task\n\n"
@@ -582,68 +680,67 @@ async def interval_selected(callback: CallbackQuery, callback_data: SelectCB, st
     SelectCB.filter(
         (F.types.is_(Pages.BULK_CONFIG))
         & (F.action.is_(Actions.CONFIRM))
-        & (F.select.in_(["✅ Create Task", "❌ Cancel"]))
+        & (F.select.in_(_CONFIRM_ACTIONS))
     )
 )
 async def create_scheduled_task(callback: CallbackQuery, callback_data: SelectCB, state: FSMContext):
     """Create the scheduled cleanup task"""
-    if callback_data.select == "❌ Cancel":
-        track = await callback.message.edit_text(
-            text="❌ Scheduled task creation cancelled",
-            reply_markup=BotKeys.cancel(server_back=callback_data.panel)
+    async with user_lock(callback):
+        # A double tap queued behind the first confirm finds the flow finished
+        if await state.get_state() != ScheduledCleanupForm.CONFIRM.state:
+            return await callback.answer()
+    
+        if callback_data.select == "❌ Cancel":
+            track = await callback.message.edit_text(
+                text="❌ Scheduled task creation cancelled",
+                reply_markup=BotKeys.cancel(server_back=callback_data.panel)
+            )
+            await state.clear()
+            return await tracker.add(track)
+    
+        server = await crud.get_server(callback_data.panel)
+        if not server:
+            track = await callback.message.edit_text(
+                text=MessageTexts.NOT_FOUND,
+                reply_markup=BotKeys.cancel()
+            )
+            await state.clear()
+            return await tracker.add(track)
+    
+        data = await state.get_data()
+        selected_admins = resolve_selected_admins(data)
+        selected_statuses = data.get("selected_statuses", [])
+        interval_hours = data.get("interval_hours", 24)
+    
+        task_id = new_task_id(server.id)
+    
+        # Create the scheduled task
+        success = await cleanup_scheduler.add_task(
+            task_id=task_id,
+            server_id=server.id,
+            admin_usernames=selected_admins,
+            status_filters=selected_statuses,
+            interval_hours=interval_hours
         )
-        await state.clear()
-        return await tracker.add(track)
     
-    server = await crud.get_server(callback_data.panel)
-    if not server:
+        if success:
+            interval_text = interval_label(interval_hours).lower()
+        
+            result_text = (
+                f"✅ Scheduled Cleanup Task Created!\n\n"
+                f"Task ID: {task_id}\n"
+                f"👥 Admins: {len(selected_admins)} selected\n"
+                f"🏷️ Status Filters: {len(selected_statuses)} selected\n"
+                f"⏱️ Runs: Every {interval_text}\n\n"
+                f"The task is now active and will run automatically."
+            )
+        else:
+            result_text = "❌ Failed to create scheduled task. Please try again."
+    
         track = await callback.message.edit_text(
-            text=MessageTexts.NOT_FOUND,
-            reply_markup=BotKeys.cancel()
+            text=result_text,
+            reply_markup=BotKeys.cancel(server_back=server.id)
         )
+    
         await state.clear()
         return await tracker.add(track)
-    
-    data = await state.get_data()
-    selected_admins = data.get("selected_admins", [])
-    selected_statuses = data.get("selected_statuses", [])
-    interval_hours = data.get("interval_hours", 24)
-    
-    # Generate task ID
-    import time
-    task_id = f"cleanup_{server.id}_{int(time.time())}"
-    
-    # Create the scheduled task
-    success = await cleanup_scheduler.add_task(
-        task_id=task_id,
-        server_id=server.id,
-        admin_usernames=selected_admins,
-        status_filters=selected_statuses,
-        interval_hours=interval_hours
-    )
-    
-    if success:
-        interval_text = f"{interval_hours} hour{'s' if interval_hours > 1 else ''}"
-        if interval_hours == 24:
-            interval_text = "daily"
-        elif interval_hours == 168:
-            interval_text = "weekly"
-        
-        result_text = (
-            f"✅ Scheduled Cleanup Task Created!\n\n"
-            f"Task ID: {task_id}\n"
-            f"👥 Admins: {len(selected_admins)} selected\n"
-            f"🏷️ Status Filters: {len(selected_statuses)} selected\n"
-            f"⏱️ Runs: Every {interval_text}\n\n"
-            f"The task is now active and will run automatically."
-        )
-    else:
-        result_text = "❌ Failed to create scheduled task. Please try again."
-    
-    track = await callback.message.edit_text(
-        text=result_text,
-        reply_markup=BotKeys.cancel(server_back=server.id)
-    )
-    
-    await state.clear()
-    return await tracker.add(track)
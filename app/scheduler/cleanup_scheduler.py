@@ -2,56 +2,128 @@
 Automatic cleanup scheduler for periodic user cleanup operations
 """
 import asyncio
+import heapq
 import logging
-from typing import Dict, List, Optional
+import os
+import sys
+import time
+from contextlib import suppress
+from typing import Dict, FrozenSet, List, Optional, Tuple
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
-import json
+from dataclasses import dataclass, field
+import orjson
 
-from app.db import crud
+from app.db import crud, Server
 from app.api import ClinetManager
 from app.models.server import ServerTypes
 from app.routers.actions.items.bulk_cleanup import BulkCleanupManager
 
 logger = logging.getLogger(__name__)
 
+# How long a server lookup is reused; misses are kept longer, since a task
+# pointing at a deleted server would otherwise hit the database every retry
+SERVER_CACHE_TTL = 60
+MISSING_SERVER_TTL = 600
 
-@dataclass
+# A run may take half its interval, but never less than this many seconds,
+# before it is abandoned so a hung panel can't hold its concurrency slot
+MIN_EXECUTION_TIMEOUT = 300
+
+
+@dataclass(slots=True)
 class CleanupTask:
     """Data class for cleanup task configuration"""
     id: str
     server_id: int
-    admin_usernames: List[str]
-    status_filters: List[str]
+    admin_usernames: Tuple[str, ...]
+    status_filters: Tuple[str, ...]
     interval_hours: int
     enabled: bool = True
     last_run: Optional[datetime] = None
     next_run: Optional[datetime] = None
     created_at: datetime = None
+    # name -> (value, formatted string), filled in by _format_time
+    _formatted: Dict[str, Tuple[datetime, str]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    # status_filters as a set, for the per-user membership checks of a run
+    _status_set: FrozenSet[str] = field(init=False, repr=False, compare=False)
     
     def __post_init__(self):
+        # Read-only once created; usernames repeat across tasks, so share them
+        self.admin_usernames = tuple(sys.intern(u) for u in self.admin_usernames)
+        self.status_filters = tuple(self.status_filters)
+        self._status_set = frozenset(self.status_filters)
         if self.created_at is None:
             self.created_at = datetime.now()
         if self.next_run is None:
             self.next_run = datetime.now() + timedelta(hours=self.interval_hours)
     
+    @property
+    def next_run_str(self) -> Optional[str]:
+        return self._format_time("next_run")
+    
+    @property
+    def last_run_str(self) -> Optional[str]:
+        return self._format_time("last_run")
+    
+    @property
+    def created_at_str(self) -> Optional[str]:
+        return self._format_time("created_at")
+    
+    def _format_time(self, name: str) -> Optional[str]:
+        """Format a timestamp field, reusing the result until the field changes"""
+        value = getattr(self, name)
+        if value is None:
+            return None
+        cached = self._formatted.get(name)
+        if cached is None or cached[0] is not value:
+            cached = self._formatted[name] = (value, value.strftime("%Y-%m-%d %H:%M"))
+        return cached[1]
+    
     def to_dict(self) -> dict:
-        """Convert to dictionary for storage"""
-        data = asdict(self)
-        # Convert datetime objects to ISO strings
-        for key, value in data.items():
-            if isinstance(value, datetime):
-                data[key] = value.isoformat() if value else None
-        return data
+        """Convert to dictionary for storage; orjson writes the datetimes as ISO strings"""
+        return {
+            "id": self.id,
+            "server_id": self.server_id,
+            "admin_usernames": self.admin_usernames,
+            "status_filters": self.status_filters,
+            "interval_hours": self.interval_hours,
+            "enabled": self.enabled,
+            "last_run": self.last_run,
+            "next_run": self.next_run,
+            "created_at": self.created_at,
+        }
     
     @classmethod
     def from_dict(cls, data: dict) -> 'CleanupTask':
         """Create from dictionary"""
-        # Convert ISO strings back to datetime objects
-        for key in ['last_run', 'next_run', 'created_at']:
-            if data.get(key):
-                data[key] = datetime.fromisoformat(data[key])
-        return cls(**data)
+        return cls(
+            id=data["id"],
+            server_id=data["server_id"],
+            admin_usernames=data["admin_usernames"],
+            status_filters=data["status_filters"],
+            interval_hours=data["interval_hours"],
+            enabled=data.get("enabled", True),
+            last_run=_parse_time(data.get("last_run")),
+            next_run=_parse_time(data.get("next_run")),
+            created_at=_parse_time(data.get("created_at")),
+        )
+
+
+def _next_slot(scheduled_for: datetime, interval_hours: int, now: datetime) -> datetime:
+    """First slot after now on the task's cadence, so run time doesn't drift the schedule"""
+    interval = timedelta(hours=interval_hours)
+    next_run = scheduled_for + interval
+    if next_run <= now:
+        # Skip slots missed while the bot was down instead of running them back to back
+        next_run += interval * ((now - next_run) // interval + 1)
+    return next_run
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Convert a stored ISO string back to a datetime"""
+    return datetime.fromisoformat(value) if value else None
 
 
 class CleanupScheduler:
@@ -59,14 +131,37 @@ class CleanupScheduler:
     
     def __init__(self):
         self.tasks: Dict[str, CleanupTask] = {}
-        self.cleanup_manager = BulkCleanupManager(
-            batch_size=5,  # Smaller batches for scheduled operations
-            concurrent_limit=1,  # Very conservative for background operations
-            rate_limit_delay=0.5  # Longer delays for background operations
-        )
+        self._by_server: Dict[int, Dict[str, CleanupTask]] = {}
+        # Heap of (monotonic due time, task id); an entry is live only while it
+        # matches _scheduled. next_run stays a datetime for storage and display
+        self._heap: List[Tuple[float, str]] = []
+        self._scheduled: Dict[str, float] = {}
+        self._wake = asyncio.Event()
+        self._executions: Dict[str, asyncio.Task] = {}
+        # server_id -> (expires_at, server or None for a cached miss)
+        self._server_cache: Dict[int, Tuple[float, Optional[Server]]] = {}
+        # Due tasks run side by side up to this limit; stop() waits for them
+        self._execution_limit = asyncio.Semaphore(4)
+        self.stop_timeout = 30
+        # Storage form of each task, refreshed only when that task changes
+        self._dict_cache: Dict[str, dict] = {}
+        # server_id -> (cleanup manager, run lock): runs on different servers
+        # proceed in parallel, runs on the same server take turns
+        self._server_runners: Dict[int, Tuple[BulkCleanupManager, asyncio.Lock]] = {}
         self.running = False
         self._scheduler_task = None
         self.storage_file = "cleanup_tasks.json"
+        # Mutations are appended here and folded into storage_file periodically
+        self.journal_file = "cleanup_tasks.log"
+        self.snapshot_every = 100
+        self._journal_entries = 0
+        # Journal records wait here for the debounced flush, off the event loop
+        self.flush_interval = 2
+        self._pending: List[dict] = []
+        # Whether anything changed since the last snapshot
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._io_lock = asyncio.Lock()
         
     async def start(self):
         """Start the scheduler"""
@@ -87,6 +182,19 @@ class CleanupScheduler:
                 await self._scheduler_task
             except asyncio.CancelledError:
                 pass
+        if self._executions:
+            # Let running cleanups finish, cancelling any that overrun
+            _, pending = await asyncio.wait(
+                list(self._executions.values()), timeout=self.stop_timeout
+            )
+            for execution in pending:
+                execution.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._flush_task:
+            # Flush now instead of waiting out the debounce window
+            self._flush_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._flush_task
         await self.save_tasks()
         logger.info("Cleanup scheduler stopped")
     
@@ -101,7 +209,7 @@ class CleanupScheduler:
         """Add a new cleanup task"""
         try:
             # Validate server exists
-            server = await crud.get_server(server_id)
+            server = await self._get_server(server_id)
             if not server:
                 logger.error(f"Server {server_id} not found")
                 return False
@@ -116,7 +224,9 @@ class CleanupScheduler:
             )
             
             self.tasks[task_id] = task
-            await self.save_tasks()
+            self._index_task(task)
+            self._schedule(task)
+            await self._append_journal("put", task_id, task)
             
             logger.info(f"Added cleanup task {task_id} for server {server_id}")
             return True
@@ -128,8 +238,14 @@ class CleanupScheduler:
     async def remove_task(self, task_id: str) -> bool:
         """Remove a cleanup task"""
         if task_id in self.tasks:
-            del self.tasks[task_id]
-            await self.save_tasks()
+            task = self.tasks.pop(task_id)
+            self._scheduled.pop(task_id, None)
+            server_tasks = self._by_server.get(task.server_id)
+            if server_tasks is not None:
+                server_tasks.pop(task_id, None)
+                if not server_tasks:
+                    del self._by_server[task.server_id]
+            await self._append_journal("delete", task_id)
             logger.info(f"Removed cleanup task {task_id}")
             return True
         return False
@@ -138,7 +254,10 @@ class CleanupScheduler:
         """Enable a cleanup task"""
         if task_id in self.tasks:
             self.tasks[task_id].enabled = True
-            await self.save_tasks()
+            # A running task queues its own next run when it finishes
+            if task_id not in self._executions:
+                self._schedule(self.tasks[task_id])
+            await self._append_journal("put", task_id, self.tasks[task_id])
             logger.info(f"Enabled cleanup task {task_id}")
             return True
         return False
@@ -147,7 +266,8 @@ class CleanupScheduler:
         """Disable a cleanup task"""
         if task_id in self.tasks:
             self.tasks[task_id].enabled = False
-            await self.save_tasks()
+            self._scheduled.pop(task_id, None)
+            await self._append_journal("put", task_id, self.tasks[task_id])
             logger.info(f"Disabled cleanup task {task_id}")
             return True
         return False
@@ -156,26 +276,59 @@ class CleanupScheduler:
         """Get all tasks"""
         return self.tasks.copy()
     
+    async def get_tasks_for_server(self, server_id: int) -> Dict[str, CleanupTask]:
+        """Get the tasks of a single server"""
+        return dict(self._by_server.get(server_id, {}))
+    
+    def _index_task(self, task: CleanupTask):
+        """Register a task in the per-server index"""
+        self._by_server.setdefault(task.server_id, {})[task.id] = task
+    
     async def get_task(self, task_id: str) -> Optional[CleanupTask]:
         """Get a specific task"""
         return self.tasks.get(task_id)
     
+    def _schedule(self, task: CleanupTask, when: Optional[float] = None):
+        """Queue the next run of a task and wake the scheduler loop"""
+        if not task.enabled or self.tasks.get(task.id) is not task:
+            return
+        if when is None:
+            when = time.monotonic() + (task.next_run.timestamp() - time.time())
+        self._scheduled[task.id] = when
+        heapq.heappush(self._heap, (when, task.id))
+        self._wake.set()
+    
     async def _scheduler_loop(self):
         """Main scheduler loop"""
         while self.running:
             try:
-                now = datetime.now()
+                self._wake.clear()
+                if not self._heap:
+                    await self._wake.wait()
+                    continue
                 
-                # Check each task
-                for task_id, task in list(self.tasks.items()):
-                    if not task.enabled:
-                        continue
-                    
-                    if task.next_run and now >= task.next_run:
-                        await self._execute_task(task)
+                when, task_id = self._heap[0]
+                if self._scheduled.get(task_id) != when:
+                    # Superseded by a newer entry, or the task was disabled/removed
+                    heapq.heappop(self._heap)
+                    continue
                 
-                # Sleep for 1 minute before next check
-                await asyncio.sleep(60)
+                # Sleep until the head is due, or until a new entry may precede it
+                delay = when - time.monotonic()
+                if delay > 0:
+                    with suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                    continue
+                
+                heapq.heappop(self._heap)
+                del self._scheduled[task_id]
+                execution = asyncio.create_task(self._run_execution(self.tasks[task_id]))
+                self._executions[task_id] = execution
+                execution.add_done_callback(
+                    lambda _, task_id=task_id: self._executions.pop(task_id, None)
+                )
+                # Yield between dispatches so a burst of due tasks can't starve handlers
+                await asyncio.sleep(0)
                 
             except asyncio.CancelledError:
                 break
@@ -183,27 +336,69 @@ class CleanupScheduler:
                 logger.error(f"Error in scheduler loop: {e}")
                 await asyncio.sleep(60)
     
+    async def _get_server(self, server_id: int) -> Optional[Server]:
+        """Get a server, reusing recent lookups including misses"""
+        now = time.monotonic()
+        cached = self._server_cache.get(server_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        server = await crud.get_server(server_id)
+        ttl = SERVER_CACHE_TTL if server else MISSING_SERVER_TTL
+        self._server_cache[server_id] = (now + ttl, server)
+        return server
+    
+    def _server_runner(self, server_id: int) -> Tuple[BulkCleanupManager, asyncio.Lock]:
+        """Cleanup manager and run lock of a server, created on first use"""
+        runner = self._server_runners.get(server_id)
+        if runner is None:
+            cleanup_manager = BulkCleanupManager(
+                batch_size=5,  # Smaller batches for scheduled operations
+                concurrent_limit=1,  # Very conservative for background operations
+                rate_limit_delay=0.5  # Longer delays for background operations
+            )
+            runner = self._server_runners[server_id] = (cleanup_manager, asyncio.Lock())
+        return runner
+    
+    async def _run_execution(self, task: CleanupTask):
+        """Execute a due task once its server is free and a concurrency slot is open"""
+        # Server first: a run queued behind its own server must not hold a slot
+        # that a task for another server could use
+        _, server_lock = self._server_runner(task.server_id)
+        async with server_lock, self._execution_limit:
+            # The task may have been disabled or removed while this run was queued,
+            # which behind the server lock can last a whole run of another task
+            if not task.enabled or self.tasks.get(task.id) is not task:
+                return
+            await self._execute_task(task)
+    
     async def _execute_task(self, task: CleanupTask):
         """Execute a cleanup task"""
+        scheduled_for = task.next_run
         try:
             logger.info(f"Executing cleanup task {task.id}")
             
             # Get server
-            server = await crud.get_server(task.server_id)
+            server = await self._get_server(task.server_id)
             if not server:
                 logger.error(f"Server {task.server_id} not found for task {task.id}")
+                # Check again once the cached miss expires
+                self._schedule(task, time.monotonic() + MISSING_SERVER_TTL)
                 return
             
-            # Execute cleanup
-            results = await self.cleanup_manager.process_bulk_cleanup(
-                server=server,
-                admins=task.admin_usernames,
-                status_filters=task.status_filters
+            # Execute cleanup; _run_execution holds the server's run lock
+            cleanup_manager, _ = self._server_runner(task.server_id)
+            results = await asyncio.wait_for(
+                cleanup_manager.process_bulk_cleanup(
+                    server=server,
+                    admins=task.admin_usernames,
+                    status_filters=task._status_set
+                ),
+                timeout=max(MIN_EXECUTION_TIMEOUT, task.interval_hours * 3600 * 0.5),
             )
             
             # Update task timing
             task.last_run = datetime.now()
-            task.next_run = task.last_run + timedelta(hours=task.interval_hours)
+            task.next_run = _next_slot(scheduled_for, task.interval_hours, task.last_run)
             
             # Log results
             logger.info(
@@ -214,40 +409,152 @@ class CleanupScheduler:
             )
             
             # Save updated task
-            await self.save_tasks()
+            self._schedule(task)
+            await self._append_journal("put", task.id, task)
             
         except Exception as e:
-            logger.error(f"Failed to execute cleanup task {task.id}: {e}")
+            if isinstance(e, asyncio.TimeoutError):
+                logger.error(f"Cleanup task {task.id} timed out")
+            else:
+                logger.error(f"Failed to execute cleanup task {task.id}: {e}")
             # Still update next run time to prevent continuous retries
-            task.next_run = datetime.now() + timedelta(hours=task.interval_hours)
+            task.next_run = _next_slot(scheduled_for, task.interval_hours, datetime.now())
+            self._schedule(task)
+            await self._append_journal("put", task.id, task)
+    
+    async def _append_journal(self, op: str, task_id: str, task: Optional[CleanupTask] = None):
+        """Queue a single task change; changes within flush_interval share one write"""
+        if task:
+            if self.tasks.get(task_id) is not task:
+                # Removed (or replaced) while a run of it was in flight
+                return
+            task_data = task.to_dict()
+            if self._dict_cache.get(task_id) == task_data:
+                # e.g. enabling a task that is already enabled
+                return
+            self._dict_cache[task_id] = task_data
+        else:
+            if self._dict_cache.pop(task_id, None) is None:
+                return
+            task_data = None
+        self._dirty = True
+        self._pending.append({"op": op, "id": task_id, "task": task_data})
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+    
+    async def _flush_later(self):
+        """Write queued journal records once the debounce window has passed"""
+        try:
+            await asyncio.sleep(self.flush_interval)
+        finally:
+            self._flush_task = None
+            # Cancellation (e.g. shutdown) only cuts the wait short: queued records
+            # are still written, and a started write finishes
+            await asyncio.shield(self._flush_journal())
+    
+    async def _flush_journal(self):
+        """Append queued records to the journal, compacting into a snapshot every so often"""
+        async with self._io_lock:
+            records, self._pending = self._pending, []
+            if not records:
+                return
+            try:
+                await asyncio.to_thread(self._write_journal, records)
+                self._journal_entries += len(records)
+            except Exception as e:
+                logger.error(f"Failed to journal cleanup tasks: {e}")
+                # Fall back to a full snapshot so the changes are not lost
+                self._journal_entries = self.snapshot_every
+        
+        if self._journal_entries >= self.snapshot_every:
             await self.save_tasks()
     
+    def _write_journal(self, records: List[dict]):
+        with open(self.journal_file, 'ab') as f:
+            f.writelines(orjson.dumps(record) + b"\n" for record in records)
+    
     async def save_tasks(self):
-        """Save tasks to file"""
+        """Save a snapshot of all tasks to file and truncate the journal"""
+        async with self._io_lock:
+            if not self._dirty:
+                return
+            try:
+                # The snapshot supersedes anything still queued for the journal
+                self._pending = []
+                self._dirty = False
+                # Cached dicts are replaced, never mutated, so a shallow copy is safe
+                data = dict(self._dict_cache)
+                await asyncio.to_thread(self._write_snapshot, data)
+                self._journal_entries = 0
+            except Exception as e:
+                self._dirty = True
+                logger.error(f"Failed to save tasks: {e}")
+    
+    def _write_snapshot(self, data: dict):
+        # Write beside the real file and swap it in, so a crash mid-write
+        # leaves the previous snapshot intact rather than a truncated one
+        tmp_file = f"{self.storage_file}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.storage_file)
+        # Replaying a journal already folded into the snapshot is harmless,
+        # so a crash between these two writes loses nothing
+        open(self.journal_file, 'w').close()
+    
+    def _read_tasks(self) -> Tuple[dict, int]:
+        """Read the snapshot and apply journaled changes on top of it"""
         try:
-            data = {task_id: task.to_dict() for task_id, task in self.tasks.items()}
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Failed to save tasks: {e}")
+            with open(self.storage_file, 'rb') as f:
+                data = orjson.loads(f.read())
+        except FileNotFoundError:
+            data = {}
+        
+        entries = 0
+        try:
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except ValueError:
+                        # A torn trailing line from a crash mid-append
+                        logger.warning("Skipping unreadable cleanup journal entry")
+                        continue
+                    if record["op"] == "delete":
+                        data.pop(record["id"], None)
+                    else:
+                        data[record["id"]] = record["task"]
+                    entries += 1
+        except FileNotFoundError:
+            pass
+        return data, entries
     
     async def load_tasks(self):
-        """Load tasks from file"""
+        """Load the task snapshot from file and replay the journal on top"""
         try:
-            with open(self.storage_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data, self._journal_entries = await asyncio.to_thread(self._read_tasks)
+            if not data:
+                logger.info("No existing tasks file found, starting with empty tasks")
+                return
             
             self.tasks = {}
+            self._by_server = {}
+            self._heap = []
+            self._scheduled = {}
+            self._dict_cache = {}
             for task_id, task_data in data.items():
                 try:
-                    self.tasks[task_id] = CleanupTask.from_dict(task_data)
+                    task = CleanupTask.from_dict(task_data)
+                    self.tasks[task_id] = task
+                    self._dict_cache[task_id] = task.to_dict()
+                    self._index_task(task)
+                    self._schedule(task)
                 except Exception as e:
                     logger.error(f"Failed to load task {task_id}: {e}")
             
             logger.info(f"Loaded {len(self.tasks)} cleanup tasks")
             
-        except FileNotFoundError:
-            logger.info("No existing tasks file found, starting with empty tasks")
         except Exception as e:
             logger.error(f"Failed to load tasks: {e}")
 
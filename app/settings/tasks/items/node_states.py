@@ -1,17 +1,41 @@
-from typing import Dict, Tuple
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Optional, Tuple
 
-# Global dictionary to track node states
-# Format: {(server_remark, node_address): is_error}
-node_states: Dict[Tuple[str, str], bool] = {}
+# Entries not updated for NODE_STATE_TTL seconds are forgotten, and beyond
+# NODE_STATE_MAXSIZE nodes on one server the least recently updated are dropped
+NODE_STATE_MAXSIZE = 1_000
+NODE_STATE_TTL = 3600
+
+# Global dictionary to track node states, least recently updated node first
+# Format: {server_remark: {node_address: (is_error, updated_at)}}
+node_states: Dict[str, "OrderedDict[str, Tuple[bool, float]]"] = {}
+
+def _lookup(
+    nodes: Optional["OrderedDict[str, Tuple[bool, float]]"], node_address: str
+) -> Optional[bool]:
+    """Returns the stored state, or None if unknown or expired"""
+    entry = nodes.get(node_address) if nodes else None
+    if entry is None:
+        return None
+    if monotonic() - entry[1] > NODE_STATE_TTL:
+        del nodes[node_address]
+        return None
+    return entry[0]
 
 def get_node_state(server_remark: str, node_address: str) -> bool:
     """Returns True if node was previously in error state, False otherwise"""
-    return node_states.get((server_remark, node_address), False)
+    return _lookup(node_states.get(server_remark), node_address) or False
 
 def set_node_state(server_remark: str, node_address: str, is_error: bool):
     """Updates node state and returns True if state changed"""
-    key = (server_remark, node_address)
-    old_state = node_states.get(key, None)
-    node_states[key] = is_error
+    nodes = node_states.get(server_remark)
+    if nodes is None:
+        nodes = node_states[server_remark] = OrderedDict()
+    old_state = _lookup(nodes, node_address)
+    nodes[node_address] = (is_error, monotonic())
+    nodes.move_to_end(node_address)
+    if len(nodes) > NODE_STATE_MAXSIZE:
+        nodes.popitem(last=False)
     # Return True if state changed (including first time seeing this node)
     return old_state != is_error
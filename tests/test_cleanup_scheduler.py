@@ -0,0 +1,188 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+# Load the routers first, as the bot does, to resolve their cycle with the scheduler
+import app.routers  # noqa: F401
+from app.scheduler import cleanup_scheduler as module
+from app.scheduler.cleanup_scheduler import CleanupScheduler
+
+RESULTS = {"total_users": 0, "total_deleted": 0, "failed": 0}
+
+
+@pytest.fixture
+def make_scheduler(tmp_path, monkeypatch):
+    """Build schedulers that share task files under tmp_path and a stubbed server."""
+    async def get_server(server_id):
+        return object()
+
+    monkeypatch.setattr(module.crud, "get_server", get_server)
+
+    def make():
+        scheduler = CleanupScheduler()
+        scheduler.storage_file = str(tmp_path / "cleanup_tasks.json")
+        scheduler.journal_file = str(tmp_path / "cleanup_tasks.log")
+        scheduler.flush_interval = 0
+        return scheduler
+
+    return make
+
+
+def _stub_cleanup(monkeypatch, run):
+    async def process_bulk_cleanup(self, server, admins, status_filters, progress_callback=None):
+        return await run()
+
+    monkeypatch.setattr(module.BulkCleanupManager, "process_bulk_cleanup", process_bulk_cleanup)
+
+
+async def _make_due(scheduler, task_id):
+    task = await scheduler.get_task(task_id)
+    task.next_run = datetime.now()
+    scheduler._schedule(task)
+
+
+def test_due_task_runs_and_disabled_task_does_not(make_scheduler, monkeypatch):
+    """Only enabled tasks are dispatched from the heap once due."""
+    calls = []
+
+    async def run():
+        calls.append(1)
+        return RESULTS
+
+    _stub_cleanup(monkeypatch, run)
+
+    async def scenario():
+        scheduler = make_scheduler()
+        await scheduler.start()
+        await scheduler.add_task("on", 1, ["admin"], ["expired"], 1)
+        await scheduler.add_task("off", 1, ["admin"], ["expired"], 1)
+        await scheduler.disable_task("off")
+        await _make_due(scheduler, "on")
+        await _make_due(scheduler, "off")
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert scheduler.tasks["on"].last_run is not None
+    assert scheduler.tasks["off"].last_run is None
+
+
+def test_task_deleted_during_run_stays_deleted(make_scheduler, monkeypatch):
+    """A run finishing after its task was removed must not store the task again."""
+    async def scenario():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def run():
+            started.set()
+            await release.wait()
+            return RESULTS
+
+        _stub_cleanup(monkeypatch, run)
+        scheduler = make_scheduler()
+        await scheduler.start()
+        await scheduler.add_task("t1", 1, ["admin"], ["expired"], 1)
+        await _make_due(scheduler, "t1")
+        await started.wait()
+        await scheduler.remove_task("t1")
+        release.set()
+        await scheduler.stop()
+
+        reloaded = make_scheduler()
+        await reloaded.load_tasks()
+        return reloaded
+
+    reloaded = asyncio.run(scenario())
+    assert list(reloaded.tasks) == []
+
+
+def test_task_disabled_while_queued_does_not_run(make_scheduler, monkeypatch):
+    """A run waiting behind another run on its server is dropped once disabled."""
+    async def scenario():
+        started = asyncio.Event()
+        release = asyncio.Event()
+        calls = []
+
+        async def run():
+            calls.append(1)
+            started.set()
+            await release.wait()
+            return RESULTS
+
+        _stub_cleanup(monkeypatch, run)
+        scheduler = make_scheduler()
+        await scheduler.start()
+        await scheduler.add_task("first", 1, ["admin"], ["expired"], 1)
+        await scheduler.add_task("queued", 1, ["admin"], ["expired"], 1)
+        await _make_due(scheduler, "first")
+        await started.wait()
+        await _make_due(scheduler, "queued")
+        await asyncio.sleep(0.05)
+        await scheduler.disable_task("queued")
+        release.set()
+        await scheduler.stop()
+        return scheduler, calls
+
+    scheduler, calls = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert scheduler.tasks["queued"].last_run is None
+
+
+def test_task_removed_while_queued_does_not_run(make_scheduler, monkeypatch):
+    """A run waiting behind another run on its server is dropped once removed."""
+    async def scenario():
+        started = asyncio.Event()
+        release = asyncio.Event()
+        calls = []
+
+        async def run():
+            calls.append(1)
+            started.set()
+            await release.wait()
+            return RESULTS
+
+        _stub_cleanup(monkeypatch, run)
+        scheduler = make_scheduler()
+        await scheduler.start()
+        await scheduler.add_task("first", 1, ["admin"], ["expired"], 1)
+        await scheduler.add_task("queued", 1, ["admin"], ["expired"], 1)
+        await _make_due(scheduler, "first")
+        await started.wait()
+        await _make_due(scheduler, "queued")
+        await asyncio.sleep(0.05)
+        await scheduler.remove_task("queued")
+        release.set()
+        await scheduler.stop()
+        return scheduler, calls
+
+    scheduler, calls = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert "queued" not in scheduler.tasks
+
+
+def test_journal_replays_on_top_of_snapshot(make_scheduler, tmp_path):
+    """Changes that only reached the journal are restored on load."""
+    async def scenario():
+        scheduler = make_scheduler()
+        await scheduler.add_task("kept", 1, ["admin"], ["expired"], 2)
+        await scheduler.add_task("gone", 1, ["admin"], ["expired"], 2)
+        await scheduler.save_tasks()
+        # After the snapshot, journal a disable and a delete only
+        await scheduler.disable_task("kept")
+        await scheduler.remove_task("gone")
+        await scheduler._flush_journal()
+        with open(scheduler.journal_file, "ab") as f:
+            f.write(b'{"op": "put", "id": "torn"')
+
+        reloaded = make_scheduler()
+        await reloaded.load_tasks()
+        return reloaded
+
+    reloaded = asyncio.run(scenario())
+    assert list(reloaded.tasks) == ["kept"]
+    assert reloaded.tasks["kept"].enabled is False
+    assert reloaded.tasks["kept"].interval_hours == 2
+    assert reloaded._journal_entries == 2
@@ -0,0 +1,61 @@
+# Load the routers first, as the bot does, to resolve their cycle with the scheduler
+import app.routers  # noqa: F401
+from app.keys import BotKeys, Pages, Actions
+from app.routers.actions.items.scheduled_cleanup import (
+    _iter_task_options,
+    _task_action_options,
+    new_task_id,
+)
+from app.scheduler.cleanup_scheduler import CleanupTask
+
+# Telegram rejects buttons whose callback_data exceeds this many bytes
+CALLBACK_DATA_LIMIT = 64
+
+
+def _callback_sizes(markup):
+    return [
+        len(button.callback_data.encode())
+        for row in markup.inline_keyboard
+        for button in row
+    ]
+
+
+def _task(enabled: bool) -> CleanupTask:
+    # The server id is packed twice into a task list button; three digits fit
+    server_id = 999
+    return CleanupTask(
+        id=new_task_id(server_id),
+        server_id=server_id,
+        admin_usernames=["admin_with_a_long_username"],
+        status_filters=["expired"],
+        interval_hours=168,
+        enabled=enabled,
+    )
+
+
+def test_task_action_buttons_fit_callback_data():
+    """Packed task action buttons stay within Telegram's callback_data limit."""
+    for enabled in (True, False):
+        task = _task(enabled)
+        markup = BotKeys.selector(
+            data=_task_action_options(task),
+            types=Pages.BULK_CONFIG,
+            action=Actions.CONFIRM,
+            panel=task.server_id,
+            extra=task.id,
+            server_back=task.server_id,
+        )
+        assert max(_callback_sizes(markup)) <= CALLBACK_DATA_LIMIT
+
+
+def test_task_list_buttons_fit_callback_data():
+    """Packed task list buttons stay within Telegram's callback_data limit."""
+    task = _task(True)
+    markup = BotKeys.selector(
+        data=_iter_task_options({task.id: task}),
+        types=Pages.BULK_CONFIG,
+        action=Actions.SELECT_SERVICE,
+        panel=task.server_id,
+        server_back=task.server_id,
+    )
+    assert max(_callback_sizes(markup)) <= CALLBACK_DATA_LIMIT